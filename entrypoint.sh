@@ -7,6 +7,7 @@ set -eu
 : "${SKIPROWS:=2}"
 : "${AMOUNT_COLUMNS:=col10,col8,col12,col11,col14,col15}"
 : "${PATTERN:=*.xlsx}"
+: "${CACHE_DIR:=}"
 
 exec python /app/parse_securities.py \
   --input-dir "$INPUT_DIR" \
@@ -14,4 +15,5 @@ exec python /app/parse_securities.py \
   --sheet "$SHEET" \
   --skiprows "$SKIPROWS" \
   --amount-columns "$AMOUNT_COLUMNS" \
-  --pattern "$PATTERN"
\ No newline at end of file
+  --pattern "$PATTERN" \
+  --cache-dir "$CACHE_DIR"
\ No newline at end of file
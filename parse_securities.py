@@ -1,87 +1,157 @@
 #!/usr/bin/env python3
 import argparse
+import contextlib
+import hashlib
+import os
 import pandas as pd
 import numpy as np
-import re
+import pyarrow as pa
+import pyarrow.compute as pc
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
+from pandas.api.types import is_numeric_dtype
 
-BUY_SELL_RE = re.compile(r'^(Buy|Sell)\s+([\d,\.]+)\s+(.*?)\s+at\s+([\d,\.]+)\s*$', re.IGNORECASE)
-REINVEST_RE = re.compile(r'^(Reinvest)\s+(.*?)\s+at\s+([\d,\.]+)\s*$', re.IGNORECASE)
+# RE2's \s is ASCII-only; these classes cover the same characters as Python's str.isspace(),
+# so NBSP and other Unicode spaces common in Excel exports still separate tokens
+WS = r'[\s\x0b\x1c-\x1f\x85\p{Z}]'
+NON_WS = r'[^\s\x0b\x1c-\x1f\x85\p{Z}]'
 
-def num(x):
-    if x is None or (isinstance(x, float) and np.isnan(x)):
-        return None
-    s = str(x).strip().replace(',', '')
+# One anchored pattern classifies and parses a description in a single match:
+# Buy/Sell fill bs/u/t1/p1, Reinvest fills ri/t2/p2. Kept RE2-compatible for
+# pyarrow.compute.extract_regex; \s and \S are swapped for WS/NON_WS below.
+TRADE_PATTERN = (
+    r'(?is)^\s*(?:(?P<bs>Buy|Sell)\s+(?P<u>[\d,.]+)\s+(?P<t1>\S(?:.*?\S)?)\s+at\s+(?P<p1>[\d,.]+)'
+    r'|(?P<ri>Reinvest)\s+(?P<t2>\S(?:.*?\S)?)\s+at\s+(?P<p2>[\d,.]+))\s*$'
+).replace(r'\s', WS).replace(r'\S', NON_WS)
+
+# python-calamine parses .xlsx far faster than openpyxl
+EXCEL_ENGINE = 'calamine'
+
+# Kernel GL text dates look like "14 Jul 2025"
+DATE_FORMAT = '%d %b %Y'
+
+OUT_COLUMNS = ['date', 'units', 'type', 'unitPrice', 'ticker', 'total']
+
+# Part of every --cache-dir key; bump whenever a change alters what parse_trades
+# returns, so caches written by older versions are never served
+CACHE_VERSION = 1
+
+def parse_amount(x):
+    # Same rules as the old per-cell num(): Unicode-aware strip, drop commas, exact float()
     try:
-        return float(s)
+        return float(str(x).strip().replace(',', ''))
+    except ValueError:
+        return np.nan
+
+def to_float(s):
+    # Numeric cells are already exact floats; only text goes through parsing
+    if is_numeric_dtype(s):
+        return s.astype(float)
+    vals = s.to_numpy(dtype=object, na_value=np.nan)
+    return pd.Series(np.fromiter((parse_amount(x) for x in vals), dtype=float, count=len(vals)), index=s.index)
+
+def iso_date(x):
+    # Scalar fallback for the few cells the column-wide parse misses; each value keeps its
+    # own local date, so tz offsets (even differing ones) cannot break the column dtype
+    try:
+        return pd.to_datetime(x).date().isoformat()
     except Exception:
         return None
 
-def parse_one_row(row, amount_columns):
-    desc = str(row.get('col5', '')).strip()
-    desc_norm = re.sub(r'\s+', ' ', desc)
-
-    date_raw = row.get('col3', None)
-    date_iso = None
-    if pd.notna(date_raw):
-        try:
-            date_iso = pd.to_datetime(date_raw).date().isoformat()
-        except Exception:
-            date_iso = str(date_raw)
-
-    total = None
-    for c in amount_columns:
-        v = num(row.get(c))
-        if v is not None and np.isfinite(v):
-            total = v
-            break
-
-    typ, units, unit_price, ticker = None, None, None, None
-
-    m = BUY_SELL_RE.match(desc_norm)
-    if m:
-        typ = m.group(1).title()
-        units = num(m.group(2))
-        ticker = m.group(3).strip()
-        unit_price = num(m.group(4))
-    else:
-        m2 = REINVEST_RE.match(desc_norm)
-        if m2:
-            typ = 'Reinvest'
-            ticker = m2.group(2).strip()
-            unit_price = num(m2.group(3))
-            if total is not None and unit_price not in (None, 0):
-                units = round(total / unit_price, 8)
-        else:
-            return None
-
-    return {
-        'date': date_iso,
-        'units': units,
-        'type': typ,
-        'unitPrice': unit_price,
-        'ticker': ticker,
-        'total': total,
-    }
-
-def parse_workbook(xlsx_path, sheet, skiprows, amount_columns):
-    # Load and normalise columns
-    df = pd.read_excel(xlsx_path, sheet_name=sheet, skiprows=skiprows)
+def iso_dates(raw):
+    # Parse the whole column at once with a known format; cache=True lets repeated
+    # trade dates share one parse
+    parsed = pd.to_datetime(raw, format=DATE_FORMAT, errors='coerce', cache=True)
+    iso = parsed.dt.strftime('%Y-%m-%d')
+    retry = iso.isna() & raw.notna()
+    if retry.any():
+        # Stragglers in a different format from the rest of the column
+        iso = iso.fillna(raw[retry].map(iso_date))
+    # Anything still unparseable is passed through as text rather than dropped
+    return iso.where(iso.notna() | raw.isna(), raw.astype(str))
+
+def to_arrow(s):
+    return pa.array(s.astype('string').to_numpy(dtype=object, na_value=None), type=pa.string())
+
+def squash_spaces(s):
+    # ' '.join(x.split()) for the whole column, done in Arrow rather than per string
+    words = pc.utf8_split_whitespace(pc.utf8_trim_whitespace(to_arrow(s)))
+    return pd.Series(pc.binary_join(words, ' ').to_numpy(zero_copy_only=False), index=s.index, dtype='string')
+
+def extract_trades(desc):
+    # Run the whole column through RE2 in Arrow; rows that do not match come back null
+    matched = pc.extract_regex(to_arrow(desc), pattern=TRADE_PATTERN)
+    ext = pd.DataFrame({f.name: field.to_numpy(zero_copy_only=False)
+                        for f, field in zip(matched.type, matched.flatten())}, index=desc.index)
+    # Groups from the branch that did not match come back as empty strings
+    return ext.mask(ext.eq('')).astype('string')
+
+def parse_trades(xlsx_path, sheet, skiprows, amount_columns):
+    # Load once and normalise columns; only col3, col5 and the amount columns are read below
+    df = pd.read_excel(xlsx_path, sheet_name=sheet, skiprows=skiprows, engine=EXCEL_ENGINE)
     df.columns = [f"col{i}" for i in range(len(df.columns))]
     desc = df.get('col5')
     if desc is None:
-        return pd.DataFrame(columns=['date','units','type','unitPrice','ticker','total'])
+        return pd.DataFrame(columns=OUT_COLUMNS)
+
+    # Classify and parse in one pass; rows that match neither branch drop out here
+    ext = extract_trades(desc)
+    is_bs = ext['bs'].notna()
+    # Work on positions of matched rows rather than materialising a filtered copy of df
+    idx = np.flatnonzero((is_bs | ext['ri'].notna()).to_numpy())
+    ext, is_bs = ext.iloc[idx], is_bs.iloc[idx]
+
+    # First finite amount in column priority order
+    amount_cols = [c for c in amount_columns if c in df]
+    if amount_cols:
+        amounts = pd.DataFrame({c: to_float(df[c].iloc[idx]) for c in amount_cols})
+        total = amounts.where(np.isfinite(amounts)).bfill(axis=1).iloc[:, 0]
+    else:
+        total = pd.Series(np.nan, index=ext.index)
 
-    trade_mask = desc.astype(str).str.contains(r'\b(Buy|Sell|Reinvest)\b', case=False, na=False)
-    trades = df[trade_mask].copy()
+    unit_price = to_float(ext['p1'].where(is_bs, ext['p2']))
+    reinvest_units = (total / unit_price.where(unit_price != 0)).round(8)
 
-    out_rows = []
-    for _, row in trades.iterrows():
-        rec = parse_one_row(row, amount_columns)
-        if rec:
-            out_rows.append(rec)
+    return pd.DataFrame({
+        'date': iso_dates(df['col3'].iloc[idx]) if 'col3' in df else None,
+        'units': to_float(ext['u']).where(is_bs, reinvest_units),
+        'type': ext['bs'].str.title().where(is_bs, 'Reinvest'),
+        'unitPrice': unit_price,
+        'ticker': squash_spaces(ext['t1'].where(is_bs, ext['t2'])),
+        'total': total,
+    }, columns=OUT_COLUMNS)
+
+def workbook_digest(xlsx_path, sheet, skiprows, amount_columns):
+    # File contents plus the parser version, output schema and settings that shape the
+    # parse, so changing any of them misses
+    with open(xlsx_path, 'rb') as fh:
+        h = hashlib.file_digest(fh, 'blake2b')
+    h.update(repr((CACHE_VERSION, OUT_COLUMNS, sheet, skiprows, list(amount_columns))).encode())
+    return h.hexdigest()[:16]
+
+def parse_workbook(xlsx_path, sheet, skiprows, amount_columns, cache_dir=None):
+    if not cache_dir:
+        return parse_trades(xlsx_path, sheet, skiprows, amount_columns)
+
+    # The cache is best-effort: a bad entry or a failed write must never cost the parsed rows
+    cached = Path(cache_dir) / f"{workbook_digest(xlsx_path, sheet, skiprows, amount_columns)}.parquet"
+    if cached.exists():
+        try:
+            return pd.read_parquet(cached)
+        except Exception as e:
+            print(f"[WARN] Ignoring unreadable cache for {Path(xlsx_path).name}: {e}")
 
-    return pd.DataFrame(out_rows, columns=['date','units','type','unitPrice','ticker','total'])
+    out = parse_trades(xlsx_path, sheet, skiprows, amount_columns)
+    # Write then rename, so a duplicate file parsed by another worker never sees a partial cache
+    tmp = cached.with_suffix(f'.{os.getpid()}.tmp')
+    try:
+        out.to_parquet(tmp, index=False)
+        os.replace(tmp, cached)
+    except Exception as e:
+        print(f"[WARN] Could not cache {Path(xlsx_path).name}: {e}")
+        with contextlib.suppress(OSError):
+            tmp.unlink(missing_ok=True)
+    return out
 
 def main():
     ap = argparse.ArgumentParser(description="Parse all Kernel GL 'Securities' trades from a folder of Excel files.")
@@ -92,6 +162,8 @@ def main():
     ap.add_argument('--amount-columns', default='col10,col8,col12,col11,col14,col15',
                     help='Comma-separated column ids to search for total')
     ap.add_argument('--pattern', default='*.xlsx', help='Glob for files (default: *.xlsx)')
+    ap.add_argument('--cache-dir', default=None,
+                    help='Directory for parsed-workbook cache keyed by file hash (disabled if empty)')
     args = ap.parse_args()
 
     in_dir = Path(args.input_dir)
@@ -102,28 +174,37 @@ def main():
         raise SystemExit(f"No files matching {args.pattern} in {in_dir}")
 
     amount_cols = [c.strip() for c in args.amount_columns.split(',') if c.strip()]
+    if args.cache_dir:
+        try:
+            Path(args.cache_dir).mkdir(parents=True, exist_ok=True)
+        except OSError as e:
+            print(f"[WARN] Cache disabled, cannot create {args.cache_dir}: {e}")
+            args.cache_dir = None
 
+    # Workbooks are independent, so parse them in parallel; results are still
+    # collected in file order to keep the output deterministic
     all_frames = []
-    for f in files:
-        try:
-            df = parse_workbook(f, args.sheet, args.skiprows, amount_cols)
-            if not df.empty:
-                all_frames.append(df)
-        except Exception as e:
-            print(f"[WARN] Skipping {f.name}: {e}")
+    with ProcessPoolExecutor(max_workers=min(len(files), os.cpu_count() or 1)) as pool:
+        futures = [pool.submit(parse_workbook, f, args.sheet, args.skiprows, amount_cols, args.cache_dir) for f in files]
+        for f, fut in zip(files, futures):
+            try:
+                df = fut.result()
+                if not df.empty:
+                    all_frames.append(df)
+            except Exception as e:
+                print(f"[WARN] Skipping {f.name}: {e}")
 
     if not all_frames:
         print("No trades found in any files.")
-        pd.DataFrame(columns=['date','units','type','unitPrice','ticker','total']).to_csv(args.output_file, index=False)
+        pd.DataFrame(columns=OUT_COLUMNS).to_csv(args.output_file, index=False)
         return
 
-    out = pd.concat(all_frames, ignore_index=True)
-    # sort if possible
-    try:
-        out['_d'] = pd.to_datetime(out['date'])
-        out = out.sort_values('_d').drop(columns=['_d'])
-    except Exception:
-        pass
+    out = pd.concat(all_frames, ignore_index=True, copy=False, sort=False)
+    # Sort by date (unparseable last); GL exports are usually already in order,
+    # in which case the frame is written as-is without reordering
+    d = pd.to_datetime(out['date'], format='%Y-%m-%d', errors='coerce', cache=True)
+    if not d.is_monotonic_increasing:
+        out = out.loc[d.sort_values().index]
 
     out.to_csv(args.output_file, index=False)
     print(f"Wrote {len(out)} rows -> {args.output_file}")